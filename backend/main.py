@@ -1,27 +1,43 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 import uvicorn
+import asyncio
+import concurrent.futures
+import importlib.util
 import io
-import base64
 from PIL import Image
 import numpy as np
-from typing import Optional
-import requests
+from typing import Dict, Optional, Tuple, Union
+from collections import OrderedDict
+import httpx
 import logging
 import os
 import sys
 import traceback
+import uuid
 from datetime import datetime
 import time
 # Try to import segmentation model, fallback to None if dependencies not available
 try:
-    from models.segmentation import segmentation_model
+    from models.segmentation import SemanticSegmentationModel
+    from models.batching import BatchedSegmenter
     SEGMENTATION_AVAILABLE = True
 except ImportError:
-    segmentation_model = None
+    SemanticSegmentationModel = None
+    BatchedSegmenter = None
     SEGMENTATION_AVAILABLE = False
 
+# Use OpenCV's GIL-releasing encoders for result images if available
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+# Use orjson for JSON responses if available (ORJSONResponse imports it itself)
+DefaultResponse = ORJSONResponse if importlib.util.find_spec("orjson") else JSONResponse
+
 # Configure logging - stdout/stderr only
 class StdoutFilter(logging.Filter):
     def filter(self, record):
@@ -47,38 +63,174 @@ stderr_handler.setFormatter(formatter)
 
 # Configure root logger
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     handlers=[stdout_handler, stderr_handler]
 )
 
 logger = logging.getLogger(__name__)
 
-logger.info(f"segmentation {SEGMENTATION_AVAILABLE}")
-app = FastAPI(title="Semantic Segmentation API")
+logger.info("segmentation %s", SEGMENTATION_AVAILABLE)
+
+# Thread pool for CPU-bound image encoding, kept off the event loop
+ENCODE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Wire format for result images; PNG at zlib level 1 costs a fraction of the
+# default level 6 CPU time and segmentation overlays still compress well
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "PNG").upper()
+OUTPUT_SAVE_OPTIONS = {
+    "PNG": {"compress_level": 1},
+    "WEBP": {"quality": 90, "method": 0},
+    "JPEG": {"quality": 85},
+}
+if OUTPUT_FORMAT not in OUTPUT_SAVE_OPTIONS:
+    logger.warning("Unsupported OUTPUT_FORMAT %s, falling back to PNG", OUTPUT_FORMAT)
+    OUTPUT_FORMAT = "PNG"
+OUTPUT_MEDIA_TYPE = f"image/{OUTPUT_FORMAT.lower()}"
+if CV2_AVAILABLE:
+    OUTPUT_IMENCODE_PARAMS = {
+        "PNG": (".png", [cv2.IMWRITE_PNG_COMPRESSION, 1]),
+        "WEBP": (".webp", [cv2.IMWRITE_WEBP_QUALITY, 90]),
+        "JPEG": (".jpg", [cv2.IMWRITE_JPEG_QUALITY, 85]),
+    }
+
+def _encode_image(img: Union[Image.Image, np.ndarray]) -> bytes:
+    """Encode an RGB PIL image or uint8 array in the configured output format"""
+    if CV2_AVAILABLE:
+        array = np.asarray(img, dtype=np.uint8)
+        ext, params = OUTPUT_IMENCODE_PARAMS[OUTPUT_FORMAT]
+        ok, encoded = cv2.imencode(ext, cv2.cvtColor(array, cv2.COLOR_RGB2BGR), params)
+        if not ok:
+            raise ValueError(f"Failed to encode image as {OUTPUT_FORMAT}")
+        return encoded.tobytes()
+    if isinstance(img, np.ndarray):
+        img = Image.fromarray(img)
+    buffered = io.BytesIO()
+    img.save(buffered, format=OUTPUT_FORMAT, **OUTPUT_SAVE_OPTIONS[OUTPUT_FORMAT])
+    return buffered.getvalue()
+
+# Source formats browsers display natively; originals in these formats are
+# served back byte-for-byte instead of being decoded and re-encoded
+PASSTHROUGH_FORMATS = {"PNG", "JPEG", "GIF", "WEBP"}
+
+def _passthrough_media_type(img: Image.Image) -> Optional[str]:
+    """Media type to serve the source bytes of a freshly opened image unchanged, or None"""
+    # EXIF-rotated images would not line up with the (unrotated) overlay, and only
+    # the first frame of an animated image is segmented
+    if (img.format in PASSTHROUGH_FORMATS and img.getexif().get(0x0112, 1) == 1
+            and not getattr(img, "is_animated", False)):
+        return Image.MIME[img.format]
+    return None
+
+async def _encode_result_images(image: Image.Image, segmented_image: Union[Image.Image, np.ndarray],
+                                original_source: Optional[Tuple[bytes, str]] = None):
+    """
+    Encode the result images in the encode pool
+
+    original_source holds the uploaded (bytes, media type) when the original
+    can be served unchanged, in which case only the overlay is encoded.
+    """
+    loop = asyncio.get_running_loop()
+    segmented_future = loop.run_in_executor(ENCODE_POOL, _encode_image, segmented_image)
+    if original_source is None:
+        original_source = (await loop.run_in_executor(ENCODE_POOL, _encode_image, image), OUTPUT_MEDIA_TYPE)
+    return original_source, (await segmented_future, OUTPUT_MEDIA_TYPE)
+
+# Inputs are downscaled so their longest edge is at most MAX_EDGE pixels;
+# post-processing and encoding costs scale with the full output resolution
+MAX_EDGE = int(os.getenv("MAX_EDGE", "1280"))
+
+def _limit_image_size(img: Image.Image) -> bool:
+    """Downscale an image in place with Lanczos so its longest edge fits MAX_EDGE; returns whether it resized"""
+    if max(img.size) > MAX_EDGE:
+        original_size = img.size
+        img.thumbnail((MAX_EDGE, MAX_EDGE), Image.Resampling.LANCZOS)
+        logger.info("Downscaled image from %s to %s", original_size, img.size)
+        return True
+    return False
+
+def _decode_image(fp) -> Tuple[Image.Image, Optional[str], Tuple[int, int]]:
+    """
+    Decode an image, convert it to RGB and clamp it to MAX_EDGE
+
+    CPU-bound, so handlers run it in the encode pool. Returns the image, the
+    media type its source bytes can be served with unchanged (or None) and
+    the source size before any downscaling.
+    """
+    image = Image.open(fp)
+    image.load()
+    source_media_type = _passthrough_media_type(image)
+    source_size = image.size
+    logger.info("Image opened - size: %s, mode: %s", image.size, image.mode)
+    
+    # Convert to RGB if necessary
+    if image.mode != 'RGB':
+        logger.info("Converting image from %s to RGB", image.mode)
+        image = image.convert('RGB')
+    
+    # Downscaled originals no longer match their source bytes (or the overlay)
+    if _limit_image_size(image):
+        source_media_type = None
+    return image, source_media_type, source_size
+
+# In-memory LRU cache of encoded results, served as raw bytes by /result/{id}
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "32"))
+result_cache: "OrderedDict[str, Dict[str, Tuple[bytes, str]]]" = OrderedDict()
+
+def _store_result(original: Tuple[bytes, str], segmented: Tuple[bytes, str]) -> str:
+    """Cache a pair of (bytes, media type) images and return the generated result id"""
+    result_id = uuid.uuid4().hex
+    result_cache[result_id] = {"original": original, "segmented": segmented}
+    while len(result_cache) > RESULT_CACHE_SIZE:
+        result_cache.popitem(last=False)
+    return result_id
+
+def _get_result(result_id: str) -> Dict[str, Tuple[bytes, str]]:
+    """Look up a cached result, marking it as recently used"""
+    result = result_cache.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    result_cache.move_to_end(result_id)
+    return result
+
+# Cached results never change for a given id, so clients may keep them
+RESULT_CACHE_HEADERS = {"Cache-Control": "private, max-age=3600, immutable"}
 
-# Request logging middleware
+def _result_urls(result_id: str) -> Dict[str, str]:
+    return {
+        "result_id": result_id,
+        "original_image_url": f"/result/{result_id}/original",
+        "segmented_image_url": f"/result/{result_id}/segmented",
+    }
+
+app = FastAPI(title="Semantic Segmentation API", default_response_class=DefaultResponse)
+# Model and batching front end are created in startup_event, off module import
+app.state.seg_model = None
+app.state.segmenter = None
+
+# Requests slower than this (seconds) are logged even when successful
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0.5"))
+
+# Request logging middleware - only logs failed, erroring or slow requests
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    # Log request
-    logger.info(f"Request: {request.method} {request.url}")
-    logger.info(f"Headers: {dict(request.headers)}")
+    start_time = time.perf_counter()
     
     # Process request
     try:
         response = await call_next(request)
-        process_time = time.time() - start_time
-        
-        # Log response
-        logger.info(f"Response: {response.status_code} - {process_time:.3f}s")
-        
-        return response
     except Exception as e:
-        process_time = time.time() - start_time
-        logger.error(f"Request failed: {str(e)} - {process_time:.3f}s")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        process_time = time.perf_counter() - start_time
+        logger.error("Request failed: %s %s - %s - %.3fs", request.method, request.url.path, e, process_time)
+        logger.error("Traceback: %s", traceback.format_exc())
         raise
+    
+    process_time = time.perf_counter() - start_time
+    if response.status_code >= 400 or process_time > SLOW_REQUEST_SECONDS:
+        logger.info("Request: %s %s - %s - %.3fs", request.method, request.url.path, response.status_code, process_time)
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request: %s %s - %s - %.3fs - headers: %s", request.method, request.url.path,
+                     response.status_code, process_time, dict(request.headers))
+    return response
 
 # Enable CORS for frontend communication
 # Configure CORS origins based on environment
@@ -97,7 +249,7 @@ def get_cors_origins():
     if custom_origins:
         origins.extend(custom_origins.split(","))
     
-    logger.info(f"CORS origins configured: {origins}")
+    logger.info("CORS origins configured: %s", origins)
     return origins
 
 app.add_middleware(
@@ -110,7 +262,7 @@ app.add_middleware(
 
 @app.get("/")
 async def root():
-    logger.info("Health check endpoint accessed")
+    logger.debug("Health check endpoint accessed")
     return {
         "message": "Semantic Segmentation API",
         "timestamp": datetime.now().isoformat(),
@@ -120,173 +272,231 @@ async def root():
 @app.post("/upload")
 async def upload_image(file: UploadFile = File(...)):
     """Handle image file upload"""
-    logger.info(f"Upload request received - filename: {file.filename}, content_type: {file.content_type}")
+    logger.info("Upload request received - filename: %s, content_type: %s", file.filename, file.content_type)
     
     # Validate file type
     if not file.content_type or not file.content_type.startswith('image/'):
-        logger.warning(f"Invalid file type: {file.content_type}")
+        logger.warning("Invalid file type: %s", file.content_type)
         raise HTTPException(status_code=400, detail="File must be an image")
     
     try:
-        # Read image
-        contents = await file.read()
-        logger.info(f"File read successfully - size: {len(contents)} bytes")
-        
-        image = Image.open(io.BytesIO(contents))
-        logger.info(f"Image opened - size: {image.size}, mode: {image.mode}")
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            logger.info(f"Converting image from {image.mode} to RGB")
-            image = image.convert('RGB')
+        # Decode straight from the spooled upload file instead of copying it into memory first
+        await file.seek(0)
+        image, source_media_type, source_size = await asyncio.get_running_loop().run_in_executor(
+            ENCODE_POOL, _decode_image, file.file)
+        file_size = file.size if file.size is not None else file.file.tell()
+        logger.info("File read successfully - size: %s bytes", file_size)
         
         # Perform semantic segmentation if available, otherwise return original
-        if SEGMENTATION_AVAILABLE and segmentation_model:
+        if SEGMENTATION_AVAILABLE and app.state.segmenter:
             logger.info("Starting semantic segmentation")
             try:
-                segmented_image = segmentation_model.segment_image(image)
+                segmented_image = await app.state.segmenter.submit(image)
                 #segmented_image = image
                 logger.info("Segmentation completed successfully")
             except Exception as e:
-                logger.error(f"Segmentation failed: {e}")
-                logger.error(f"Fallback to original image")
+                logger.error("Segmentation failed: %s", e)
+                logger.error("Fallback to original image")
                 segmented_image = image  # Fallback to original image
         else:
             logger.warning("Segmentation model not available, returning original image")
             segmented_image = image  # Fallback to original image
         
-        # Convert original image to base64
-        logger.info("Converting images to base64")
-        original_buffered = io.BytesIO()
-        image.save(original_buffered, format="PNG")
-        original_img_str = base64.b64encode(original_buffered.getvalue()).decode()
+        # Serve the uploaded bytes as the original when possible instead of re-encoding
+        original_source = None
+        if source_media_type:
+            await file.seek(0)
+            original_source = (await file.read(), source_media_type)
         
-        # Convert segmented image to base64
-        segmented_buffered = io.BytesIO()
-        segmented_image.save(segmented_buffered, format="PNG")
-        segmented_img_str = base64.b64encode(segmented_buffered.getvalue()).decode()
+        # Encode the result images in the encode pool
+        logger.info("Encoding images to %s", OUTPUT_FORMAT)
+        original, segmented = await _encode_result_images(image, segmented_image, original_source)
+        result_id = _store_result(original, segmented)
         
-        logger.info(f"Upload processed successfully - original: {len(original_img_str)} chars, segmented: {len(segmented_img_str)} chars")
+        logger.info("Upload processed successfully - result: %s, original: %s bytes, segmented: %s bytes", result_id, len(original[0]), len(segmented[0]))
         
         return {
-            "original_image": original_img_str,
-            "segmented_image": segmented_img_str,
+            **_result_urls(result_id),
             "filename": file.filename,
             "processing_info": {
                 "segmentation_available": SEGMENTATION_AVAILABLE,
-                "image_size": image.size,
-                "file_size_bytes": len(contents)
+                "image_size": source_size,
+                "processed_image_size": image.size,
+                "file_size_bytes": file_size
             }
         }
     
     except HTTPException as e:
-        logger.error(f"{e}")
+        logger.error("%s", e)
         raise
     except Exception as e:
-        logger.error(f"Error processing uploaded image: {str(e)}")
-        logger.error(f"Error traceback: {traceback.format_exc()}")
+        logger.error("Error processing uploaded image: %s", e)
+        logger.error("Error traceback: %s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 @app.post("/segment-url")
 async def segment_from_url(image_url: str):
     """Handle image segmentation from URL"""
-    logger.info(f"URL segmentation request received - URL: {image_url}")
+    logger.info("URL segmentation request received - URL: %s", image_url)
     
     try:
         # Validate URL format
         if not image_url.startswith(('http://', 'https://')):
-            logger.warning(f"Invalid URL format: {image_url}")
+            logger.warning("Invalid URL format: %s", image_url)
             raise HTTPException(status_code=400, detail="Invalid URL format")
         
         # Download image from URL
-        logger.info(f"Downloading image from URL: {image_url}")
-        response = requests.get(image_url, timeout=10, headers={
-            'User-Agent': 'Semantic-Segmentation-App/1.0'
-        })
-        response.raise_for_status()
+        logger.info("Downloading image from URL: %s", image_url)
+        async with app.state.http.stream('GET', image_url) as response:
+            response.raise_for_status()
+            
+            # Validate content type before pulling the body
+            content_type = response.headers.get('content-type', '')
+            if not content_type.startswith('image/'):
+                logger.warning("URL does not point to an image - content-type: %s", content_type)
+                raise HTTPException(status_code=400, detail="URL does not point to an image")
+            
+            buffered = io.BytesIO()
+            async for chunk in response.aiter_bytes(chunk_size=65536):
+                buffered.write(chunk)
         
-        logger.info(f"Image downloaded successfully - size: {len(response.content)} bytes, content-type: {response.headers.get('content-type')}")
-        
-        # Validate content type
-        content_type = response.headers.get('content-type', '')
-        if not content_type.startswith('image/'):
-            logger.warning(f"URL does not point to an image - content-type: {content_type}")
-            raise HTTPException(status_code=400, detail="URL does not point to an image")
-        
-        image = Image.open(io.BytesIO(response.content))
-        logger.info(f"Image opened from URL - size: {image.size}, mode: {image.mode}")
-        
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            logger.info(f"Converting image from {image.mode} to RGB")
-            image = image.convert('RGB')
+        downloaded_size = buffered.tell()
+        logger.info("Image downloaded successfully - size: %s bytes, content-type: %s", downloaded_size, content_type)
+        buffered.seek(0)
+        image, source_media_type, source_size = await asyncio.get_running_loop().run_in_executor(
+            ENCODE_POOL, _decode_image, buffered)
         
         # Perform semantic segmentation if available, otherwise return original
-        if SEGMENTATION_AVAILABLE and segmentation_model:
+        if SEGMENTATION_AVAILABLE and app.state.segmenter:
             logger.info("Starting semantic segmentation on URL image")
             try:
-                segmented_image = segmentation_model.segment_image(image)
+                segmented_image = await app.state.segmenter.submit(image)
                 logger.info("Segmentation completed successfully")
             except Exception as e:
-                logger.error(f"Segmentation failed: {e}")
-                logger.error(f"Fallback to original image")
+                logger.error("Segmentation failed: %s", e)
+                logger.error("Fallback to original image")
                 segmented_image = image  # Fallback to original image
         else:
             logger.warning("Segmentation model not available, returning original image")
             segmented_image = image  # Fallback to original image
         
-        # Convert original image to base64
-        logger.info("Converting images to base64")
-        original_buffered = io.BytesIO()
-        image.save(original_buffered, format="PNG")
-        original_img_str = base64.b64encode(original_buffered.getvalue()).decode()
+        # Serve the downloaded bytes as the original when possible instead of re-encoding
+        original_source = (buffered.getvalue(), source_media_type) if source_media_type else None
         
-        # Convert segmented image to base64
-        segmented_buffered = io.BytesIO()
-        segmented_image.save(segmented_buffered, format="PNG")
-        segmented_img_str = base64.b64encode(segmented_buffered.getvalue()).decode()
+        # Encode the result images in the encode pool
+        logger.info("Encoding images to %s", OUTPUT_FORMAT)
+        original, segmented = await _encode_result_images(image, segmented_image, original_source)
+        result_id = _store_result(original, segmented)
         
-        logger.info(f"URL processing completed successfully - original: {len(original_img_str)} chars, segmented: {len(segmented_img_str)} chars")
+        logger.info("URL processing completed successfully - result: %s, original: %s bytes, segmented: %s bytes", result_id, len(original[0]), len(segmented[0]))
         
         return {
-            "original_image": original_img_str,
-            "segmented_image": segmented_img_str,
+            **_result_urls(result_id),
             "source_url": image_url,
             "processing_info": {
                 "segmentation_available": SEGMENTATION_AVAILABLE,
-                "image_size": image.size,
-                "downloaded_size_bytes": len(response.content),
+                "image_size": source_size,
+                "processed_image_size": image.size,
+                "downloaded_size_bytes": downloaded_size,
                 "content_type": content_type
             }
         }
     
     except HTTPException:
         raise
-    except requests.exceptions.Timeout as e:
-        logger.error(f"Timeout downloading image from URL: {image_url} - {str(e)}")
+    except httpx.TimeoutException as e:
+        logger.error("Timeout downloading image from URL: %s - %s", image_url, e)
         raise HTTPException(status_code=400, detail="Timeout downloading image from URL")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error downloading image from URL: {image_url} - {str(e)}")
+    except httpx.HTTPError as e:
+        logger.error("Error downloading image from URL: %s - %s", image_url, e)
         raise HTTPException(status_code=400, detail=f"Error downloading image: {str(e)}")
     except Exception as e:
-        logger.error(f"Error processing image from URL: {image_url} - {str(e)}")
-        logger.error(f"Error traceback: {traceback.format_exc()}")
+        logger.error("Error processing image from URL: %s - %s", image_url, e)
+        logger.error("Error traceback: %s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
+@app.get("/result/{result_id}/original")
+async def get_original_image(result_id: str):
+    """Return the original image of a cached result as raw image bytes"""
+    content, media_type = _get_result(result_id)["original"]
+    return Response(content=content, media_type=media_type, headers=RESULT_CACHE_HEADERS)
+
+@app.get("/result/{result_id}/segmented")
+async def get_segmented_image(result_id: str):
+    """Return the segmented image of a cached result as raw image bytes"""
+    content, media_type = _get_result(result_id)["segmented"]
+    return Response(content=content, media_type=media_type, headers=RESULT_CACHE_HEADERS)
+
+@app.get("/result/{result_id}")
+async def get_result(result_id: str):
+    """Return both images of a cached result as a multipart/mixed body"""
+    result = _get_result(result_id)
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name in ("original", "segmented"):
+        content, media_type = result[name]
+        body.write(f"--{boundary}\r\n".encode())
+        body.write(f"Content-Type: {media_type}\r\nContent-Disposition: inline; name=\"{name}\"\r\n\r\n".encode())
+        body.write(content)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return Response(content=body.getvalue(), media_type=f"multipart/mixed; boundary={boundary}",
+                    headers=RESULT_CACHE_HEADERS)
+
+async def _load_segmentation_model():
+    """Load and warm up the model on its inference thread, then start the batching front end"""
+    loop = asyncio.get_running_loop()
+    # Build the model on its inference thread so compilation and CUDA graph capture
+    # happen on the same thread as every later forward pass
+    infer_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+    try:
+        seg_model = await loop.run_in_executor(infer_pool, SemanticSegmentationModel, infer_pool)
+    except Exception as e:
+        logger.error("Failed to initialize segmentation model: %s", e)
+        infer_pool.shutdown(wait=False)
+        return
+    # Micro-batches concurrent requests into a single model forward pass
+    segmenter = BatchedSegmenter(seg_model, executor=ENCODE_POOL)
+    try:
+        await seg_model.run_in_infer_pool(seg_model.warmup, segmenter.max_batch_size)
+    except Exception as e:
+        # A failed warm-up only means the first requests pay the one-time costs
+        logger.error("Model warm-up failed, continuing without it: %s", e)
+    app.state.seg_model = seg_model
+    app.state.segmenter = segmenter
+    app.state.segmenter.start()
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("=== Semantic Segmentation API Starting ===")
-    logger.info(f"Segmentation model available: {SEGMENTATION_AVAILABLE}")
+    logger.info("Segmentation model available: %s", SEGMENTATION_AVAILABLE)
+    # Shared client for /segment-url downloads, so connections are pooled across requests
+    app.state.http = httpx.AsyncClient(
+        timeout=10,
+        follow_redirects=True,
+        headers={'User-Agent': 'Semantic-Segmentation-App/1.0'},
+        limits=httpx.Limits(max_connections=100),
+    )
+    if SEGMENTATION_AVAILABLE:
+        await _load_segmentation_model()
     logger.info("API endpoints configured:")
     logger.info("  GET  / - Health check")
     logger.info("  POST /upload - Image file upload")
     logger.info("  POST /segment-url - Process image from URL")
+    logger.info("  GET  /result/{id} - Cached result images")
     logger.info("=== Startup Complete ===")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("=== Semantic Segmentation API Shutting Down ===")
+    await app.state.http.aclose()
+    if app.state.segmenter:
+        await app.state.segmenter.stop()
+    if app.state.seg_model:
+        app.state.seg_model.close()
+    ENCODE_POOL.shutdown(wait=False)
 
 if __name__ == "__main__":
     logger.info("Starting uvicorn server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info",
+                access_log=False)
\ No newline at end of file
@@ -1,9 +1,10 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
 import io
-import base64
+import uuid
+from collections import OrderedDict
 from PIL import Image
 from typing import Optional
 import requests
@@ -19,6 +20,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# In-memory LRU cache of result images, served as raw PNG bytes by /result/{id}
+RESULT_CACHE_SIZE = 32
+result_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+def store_result(png_bytes: bytes) -> dict:
+    """Cache a result image and return the result id and image URLs"""
+    result_id = uuid.uuid4().hex
+    result_cache[result_id] = png_bytes
+    while len(result_cache) > RESULT_CACHE_SIZE:
+        result_cache.popitem(last=False)
+    return {
+        "result_id": result_id,
+        "original_image_url": f"/result/{result_id}/original",
+        "segmented_image_url": f"/result/{result_id}/segmented",
+    }
+
 @app.get("/")
 async def root():
     return {"message": "Semantic Segmentation API", "status": "running"}
@@ -45,11 +62,9 @@ async def upload_image(file: UploadFile = File(...)):
         # For testing, return the original image as both original and "segmented"
         buffered = io.BytesIO()
         image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
         
         return {
-            "original_image": img_str,
-            "segmented_image": img_str,  # Same as original for testing
+            **store_result(buffered.getvalue()),  # Same image as original and segmented for testing
             "filename": file.filename,
             "message": "Image processed (test mode - no actual segmentation)"
         }
@@ -74,11 +89,9 @@ async def segment_from_url(image_url: str):
         # For testing, return the original image as both original and "segmented"
         buffered = io.BytesIO()
         image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
         
         return {
-            "original_image": img_str,
-            "segmented_image": img_str,  # Same as original for testing
+            **store_result(buffered.getvalue()),  # Same image as original and segmented for testing
             "source_url": image_url,
             "message": "Image processed (test mode - no actual segmentation)"
         }
@@ -88,5 +101,12 @@ async def segment_from_url(image_url: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
+@app.get("/result/{result_id}/{kind}")
+async def get_result_image(result_id: str, kind: str):
+    """Return a cached result image as raw PNG bytes"""
+    if kind not in ("original", "segmented") or result_id not in result_cache:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return Response(content=result_cache[result_id], media_type="image/png")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from models.segmentation import SemanticSegmentationModel
+
+
+class BatchedSegmenter:
+    """
+    Micro-batching front end for SemanticSegmentationModel
+
+    Concurrent requests are collected for up to max_wait seconds (or until
+    max_batch_size are queued) and run through the model in one forward pass.
+    Only the forward pass runs on the model's inference thread; preprocessing
+    and overlay rendering run on the given executor.
+    """
+
+    def __init__(self, model: SemanticSegmentationModel,
+                 max_batch_size: Optional[int] = None, max_wait: Optional[float] = None,
+                 executor: Optional[concurrent.futures.Executor] = None):
+        self.logger = logging.getLogger(__name__)
+        self.model = model
+        self.executor = executor
+        # Batching only pays off on the GPU; on the CPU a bigger batch just takes proportionally longer
+        default_batch_size = "1" if model.device.type == 'cpu' else "8"
+        self.max_batch_size = max_batch_size or int(os.getenv("BATCH_MAX_SIZE", default_batch_size))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("BATCH_MAX_WAIT", "0.01"))
+        self._queue: Optional["asyncio.Queue[Tuple[torch.Tensor, asyncio.Future]]"] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background batching task on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            self.logger.info("Batching enabled - max batch size: %s, max wait: %.0fms", self.max_batch_size, self.max_wait * 1000)
+
+    async def stop(self):
+        """Cancel the background batching task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, image: Image.Image) -> np.ndarray:
+        """
+        Segment an image as part of the next batch
+
+        Args:
+            image: PIL Image object
+
+        Returns:
+            RGB uint8 numpy array with segmentation overlay
+        """
+        if self.model.model is None or self._task is None:
+            self.logger.warning("Model not loaded, returning original image")
+            return self.model.to_rgb_array(image)
+
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        input_tensor, original = await loop.run_in_executor(self.executor, self.model.preprocess_image, image)
+        if self.max_batch_size <= 1:
+            predictions = (await self.model.run_in_infer_pool(self.model.infer, input_tensor.unsqueeze(0)))[0]
+        else:
+            future = loop.create_future()
+            await self._queue.put((input_tensor, future))
+            predictions = await future
+        overlay = await loop.run_in_executor(self.executor, self.model.render_overlay, original, predictions)
+        self.logger.info("Batched segmentation completed in %.3fs total", time.time() - start_time)
+        return overlay
+
+    async def _collect(self) -> List[Tuple[torch.Tensor, asyncio.Future]]:
+        """Wait for the first request, then gather more until the batch is full or the window closes"""
+        items = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            items = [(tensor, future) for tensor, future in items if not future.cancelled()]
+            if not items:
+                continue
+            try:
+                batch = torch.stack([tensor for tensor, _ in items])
+                predictions = await self.model.run_in_infer_pool(self.model.infer, batch)
+            except Exception as e:
+                self.logger.error("Batched inference failed: %s", e)
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for i, (_, future) in enumerate(items):
+                if not future.done():
+                    future.set_result(predictions[i])
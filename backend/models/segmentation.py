@@ -1,20 +1,119 @@
+import asyncio
+import concurrent.futures
 import torch
-import torchvision.transforms as transforms
+import torch.nn.functional as F
 from torchvision.models.segmentation import deeplabv3_resnet50
 import numpy as np
 from PIL import Image
 import cv2
 import logging
+import os
+import threading
 import time
+import warnings
+from typing import Optional, Tuple
+
+# Use a numba-compiled fused palette lookup + blend if numba is available
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def blend_with_palette(original, class_ids, palette, out, a256):
+        """Write (original * a256 + palette[class_ids] * (256 - a256)) >> 8 into out in one pass"""
+        h, w = class_ids.shape
+        for y in prange(h):
+            for x in range(w):
+                color = palette[class_ids[y, x]]
+                for c in range(3):
+                    out[y, x, c] = (original[y, x, c] * a256 + color[c] * (256 - a256)) >> 8
+        return out
+
+# Colors for the PASCAL VOC classes predicted by DeepLabV3
+VOC_COLORS = [
+    [0, 0, 0],       # background
+    [128, 0, 0],     # aeroplane
+    [0, 128, 0],     # bicycle
+    [128, 128, 0],   # bird
+    [0, 0, 128],     # boat
+    [128, 0, 128],   # bottle
+    [0, 128, 128],   # bus
+    [128, 128, 128], # car
+    [64, 0, 0],      # cat
+    [192, 0, 0],     # chair
+    [64, 128, 0],    # cow
+    [192, 128, 0],   # dining table
+    [64, 0, 128],    # dog
+    [192, 0, 128],   # horse
+    [64, 128, 128],  # motorbike
+    [192, 128, 128], # person
+    [0, 64, 0],      # potted plant
+    [128, 64, 0],    # sheep
+    [0, 192, 0],     # sofa
+    [128, 192, 0],   # train
+    [0, 64, 128],    # tv/monitor
+]
 
 class SemanticSegmentationModel:
-    def __init__(self):
+    OVERLAY_ALPHA = 0.6  # Transparency factor for the original image in the overlay
+    INPUT_SIZE = (520, 520)  # Model input resolution (H, W)
+    
+    def __init__(self, infer_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None):
+        """
+        Args:
+            infer_pool: single-thread executor to run model work on; construct
+                the model on that same thread so that loading, compilation and
+                CUDA graph capture share the thread inference runs on
+        """
         self.logger = logging.getLogger(__name__)
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.logger.info(f"Using device: {self.device}")
+        self.logger.info("Using device: %s", self.device)
+        # Let cuDNN autotune convolution algorithms for the fixed input size
+        torch.backends.cudnn.benchmark = self.device.type == 'cuda'
+        # Leave half the cores to the web server and encoding threads
+        torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", max(1, (os.cpu_count() or 2) // 2))))
+        # Single dedicated thread for model work, keeping it off the event loop
+        # and pinned to one thread for CUDA stream affinity
+        self._infer_pool = infer_pool or concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        # Mixed precision for inference: FP16 on Tensor Core GPUs, BF16 only on CPUs
+        # with native support (emulated BF16 convs are much slower than FP32)
+        self.autocast_dtype = self.select_autocast_dtype()
+        self.logger.info("Autocast dtype: %s", self.autocast_dtype or "disabled (FP32)")
         self.model = None
+        # Per-thread scratch buffers reused across requests of matching size
+        self._buf = threading.local()
+        self._palette = self.build_palette()
+        self._palette_gpu = torch.from_numpy(self._palette).to(self.device)
+        # ImageNet normalization constants, kept on the device for preprocessing
+        self._mean = torch.tensor([0.485, 0.456, 0.406], device=self.device).view(1, 3, 1, 1)
+        self._std = torch.tensor([0.229, 0.224, 0.225], device=self.device).view(1, 3, 1, 1)
         self.load_model()
         
+    def select_autocast_dtype(self):
+        """
+        Pick the autocast dtype for inference, or None to run in FP32
+        
+        CPU_BF16 forces BF16 on ("1") or off ("0") for CPU inference; by
+        default it is used only when oneDNN reports native BF16 support.
+        """
+        if self.device.type == 'cuda':
+            return torch.float16
+        setting = os.getenv("CPU_BF16", "auto").lower()
+        if setting == "auto":
+            try:
+                return torch.bfloat16 if torch.ops.mkldnn._is_mkldnn_bf16_supported() else None
+            except (AttributeError, RuntimeError):
+                return None
+        return torch.bfloat16 if setting in ("1", "true", "yes") else None
+    
+    def autocast(self):
+        """Autocast context for inference, disabled when running in FP32"""
+        return torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype,
+                              enabled=self.autocast_dtype is not None)
+    
     def load_model(self):
         """Load pre-trained DeepLabV3 model"""
         try:
@@ -24,24 +123,163 @@ class SemanticSegmentationModel:
             # Load pre-trained DeepLabV3 model
             self.model = deeplabv3_resnet50(pretrained=True)
             self.model.eval()
-            self.model.to(self.device)
-            
-            # Define preprocessing transforms
-            self.preprocess = transforms.Compose([
-                transforms.Resize((520, 520)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                                   std=[0.229, 0.224, 0.225])
-            ])
+            self.model.to(self.device, memory_format=torch.channels_last)
+            self.optimize_model()
             
             load_time = time.time() - start_time
-            self.logger.info(f"Model loaded successfully on {self.device} in {load_time:.2f}s")
+            self.logger.info("Model loaded successfully on %s in %.2fs", self.device, load_time)
             
         except Exception as e:
-            self.logger.error(f"Error loading model: {e}")
+            self.logger.error("Error loading model: %s", e)
             self.model = None
     
-    def segment_image(self, image: Image.Image) -> Image.Image:
+    def optimize_model(self):
+        """
+        Compile the eager model to remove per-layer dispatch overhead
+        
+        MODEL_COMPILE selects "compile" (torch.compile, default), "trace"
+        (TorchScript) or "none". Falls back to eager mode on failure.
+        """
+        mode = os.getenv("MODEL_COMPILE", "compile").lower()
+        if mode == "none":
+            return
+        if mode == "compile" and not hasattr(torch, "compile"):
+            mode = "trace"
+        
+        try:
+            start_time = time.time()
+            example = torch.randn(1, 3, *self.INPUT_SIZE, device=self.device).to(memory_format=torch.channels_last)
+            if mode == "compile":
+                optimized = torch.compile(self.model, mode="reduce-overhead", fullgraph=False)
+            else:
+                with torch.no_grad():
+                    optimized = torch.jit.trace(self.model, example, strict=False)
+            
+            # Compilation is lazy, so run one forward pass to surface failures here
+            with torch.inference_mode(), self.autocast():
+                optimized(example)
+            self.model = optimized
+            self.logger.info("Model optimized with %s in %.2fs", mode, time.time() - start_time)
+        except Exception as e:
+            self.logger.warning("Model optimization with %s failed, using eager mode: %s", mode, e)
+    
+    def warmup(self, max_batch_size=1):
+        """
+        Pay one-time costs (compilation, CUDA graph capture per batch
+        size, cuDNN autotuning, the numba blend JIT, allocator growth)
+        before the first request
+        
+        Args:
+            max_batch_size: largest batch size the batcher will submit
+        """
+        if self.model is None:
+            return
+        start_time = time.time()
+        if self.device.type == 'cuda':
+            # CUDA graphs are captured per input shape after a few runs, so cover every batch size
+            iterations = 3
+            batch_sizes = range(1, max_batch_size + 1)
+        else:
+            # On the CPU batch size 1 compiles a static graph and batch size 2 triggers
+            # the one dynamic-shape recompile that serves every larger batch
+            iterations = 1
+            batch_sizes = range(1, min(max_batch_size, 2) + 1)
+        for batch_size in batch_sizes:
+            dummy = torch.zeros(batch_size, 3, *self.INPUT_SIZE, device=self.device)
+            for _ in range(iterations):
+                self.infer(dummy)
+        # Run the full pipeline once so preprocessing and post-processing are warm too
+        self.segment_image(Image.new('RGB', (640, 480)))
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize()
+        self.logger.info("Model warm-up completed in %.2fs", time.time() - start_time)
+    
+    def to_rgb_array(self, image: Image.Image) -> np.ndarray:
+        """
+        Convert an image into a 3-channel RGB uint8 array
+        
+        Args:
+            image: PIL Image object
+            
+        Returns:
+            numpy array of shape (H, W, 3)
+        """
+        # asarray on a loaded image converts in one pass without an extra copy
+        image.load()
+        original_array = np.asarray(image, dtype=np.uint8)
+        if len(original_array.shape) == 2:  # Grayscale
+            original_array = cv2.cvtColor(original_array, cv2.COLOR_GRAY2RGB)
+        elif original_array.shape[2] == 4:  # RGBA
+            original_array = cv2.cvtColor(original_array, cv2.COLOR_RGBA2RGB)
+        return original_array
+    
+    def preprocess_image(self, image: Image.Image) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Convert an image into a normalized model input tensor
+        
+        The full-size uint8 image is uploaded as-is and resized and
+        normalized on the device with tensor ops.
+        
+        Args:
+            image: PIL Image object
+            
+        Returns:
+            tuple of the input tensor of shape (3, 520, 520) and the uploaded
+            uint8 original of shape (H, W, 3), both on the device
+        """
+        self.logger.debug("Preprocessing image...")
+        original_array = self.to_rgb_array(image)
+        with warnings.catch_warnings():
+            # The array may be a read-only view of the image bytes; it is never written to
+            warnings.simplefilter("ignore", UserWarning)
+            original = torch.from_numpy(original_array).to(self.device)
+        tensor = original.permute(2, 0, 1).unsqueeze(0).float()
+        tensor = F.interpolate(tensor, size=self.INPUT_SIZE, mode='bilinear',
+                               align_corners=False, antialias=True)
+        return tensor.div_(255.0).sub_(self._mean).div_(self._std)[0], original
+    
+    def infer(self, input_batch: torch.Tensor) -> torch.Tensor:
+        """
+        Run the model on a batch of preprocessed inputs
+        
+        Args:
+            input_batch: tensor of shape (N, 3, 520, 520)
+            
+        Returns:
+            uint8 class map tensor of shape (N, 520, 520) on the device
+        """
+        self.logger.debug("Performing inference...")
+        inference_start = time.time()
+        input_batch = input_batch.to(self.device, memory_format=torch.channels_last)
+        with torch.inference_mode(), self.autocast():
+            output = self.model(input_batch)['out']
+            # argmax into a fresh tensor: compiled (CUDA graph) outputs are reused by the next call
+            predictions = output.argmax(1).to(torch.uint8)
+        inference_time = time.time() - inference_start
+        self.logger.info("Inference completed in %.3fs for batch of %s", inference_time, input_batch.shape[0])
+        return predictions
+    
+    def render_overlay(self, original: torch.Tensor, predictions: torch.Tensor) -> np.ndarray:
+        """
+        Blend the predictions for one image over the original
+        
+        Args:
+            original: uint8 original of shape (H, W, 3) as returned by preprocess_image
+            predictions: uint8 class map tensor of shape (520, 520)
+            
+        Returns:
+            RGB uint8 numpy array with segmentation overlay
+        """
+        # Post-process on the GPU when available so only the final overlay is copied back
+        self.logger.debug("Processing predictions...")
+        if self.device.type == 'cuda':
+            overlay = self.postprocess_gpu(predictions, original)
+        else:
+            overlay = self.postprocess_cpu(predictions, original.numpy())
+        
+        return overlay
+    
+    def segment_image(self, image: Image.Image) -> np.ndarray:
         """
         Perform semantic segmentation on an image
         
@@ -49,129 +287,146 @@ class SemanticSegmentationModel:
             image: PIL Image object
             
         Returns:
-            PIL Image object with segmentation overlay
+            RGB uint8 numpy array with segmentation overlay
         """
         if self.model is None:
             self.logger.warning("Model not loaded, returning original image")
-            return image
+            return self.to_rgb_array(image)
             
         try:
             start_time = time.time()
-            self.logger.info(f"Starting segmentation for image size: {image.size}")
-            
-            # Store original size
-            original_size = image.size
-            
-            # Preprocess image
-            self.logger.debug("Preprocessing image...")
-            input_tensor = self.preprocess(image)
-            input_batch = input_tensor.unsqueeze(0).to(self.device)
-            
-            # Perform inference
-            self.logger.debug("Performing inference...")
-            inference_start = time.time()
-            with torch.no_grad():
-                output = self.model(input_batch)['out'][0]
-            inference_time = time.time() - inference_start
-            self.logger.info(f"Inference completed in {inference_time:.3f}s")
-                
-            # Get predicted class for each pixel
-            self.logger.debug("Processing predictions...")
-            output_predictions = output.argmax(0).cpu().numpy()
-            unique_classes = np.unique(output_predictions)
-            self.logger.info(f"Detected classes: {unique_classes.tolist()}")
-            
-            # Create colored segmentation mask
-            segmentation_mask = self.create_colored_mask(output_predictions)
-            
-            # Resize back to original size
-            self.logger.debug(f"Resizing mask from {segmentation_mask.shape} to {original_size}")
-            segmentation_mask = cv2.resize(segmentation_mask, original_size)
-            
-            # Ensure both images have same number of channels
-            original_array = np.array(image)
-            if len(original_array.shape) == 2:  # Grayscale
-                original_array = cv2.cvtColor(original_array, cv2.COLOR_GRAY2RGB)
-            elif original_array.shape[2] == 4:  # RGBA
-                original_array = cv2.cvtColor(original_array, cv2.COLOR_RGBA2RGB)
-            
-            # Ensure segmentation mask is 3-channel
-            if len(segmentation_mask.shape) == 2:
-                segmentation_mask = cv2.cvtColor(segmentation_mask, cv2.COLOR_GRAY2RGB)
-            
-            # Create overlay (blend original image with segmentation mask)
-            alpha = 0.6  # Transparency factor
-            overlay = cv2.addWeighted(original_array.astype(np.uint8), alpha, 
-                                    segmentation_mask.astype(np.uint8), 1-alpha, 0)
-            
-            # Convert back to PIL Image
-            result_image = Image.fromarray(overlay)
+            self.logger.info("Starting segmentation for image size: %s", image.size)
+            
+            input_tensor, original = self.preprocess_image(image)
+            predictions = self.infer(input_tensor.unsqueeze(0))[0]
+            overlay = self.render_overlay(original, predictions)
             
             total_time = time.time() - start_time
-            self.logger.info(f"Segmentation completed successfully in {total_time:.3f}s total")
+            self.logger.info("Segmentation completed successfully in %.3fs total", total_time)
             
-            return result_image
+            return overlay
             
         except Exception as e:
-            self.logger.error(f"Error during segmentation: {e}")
-            self.logger.error(f"Segmentation error traceback:", exc_info=True)
+            self.logger.error("Error during segmentation: %s", e)
+            self.logger.error("Segmentation error traceback:", exc_info=True)
             # Return original image on error instead of causing server crash
-            return image
+            return self.to_rgb_array(image)
+    
+    async def run_in_infer_pool(self, func, *args):
+        """Run func(*args) on the dedicated inference thread and await the result"""
+        return await asyncio.get_running_loop().run_in_executor(self._infer_pool, func, *args)
     
-    def create_colored_mask(self, predictions):
+    async def segment_image_async(self, image: Image.Image) -> np.ndarray:
+        """Run segment_image on the inference thread without blocking the event loop"""
+        return await self.run_in_infer_pool(self.segment_image, image)
+    
+    def close(self):
+        """Shut down the inference thread"""
+        self._infer_pool.shutdown(wait=False)
+    
+    def postprocess_cpu(self, predictions: torch.Tensor, original_array: np.ndarray) -> np.ndarray:
+        """
+        Turn predicted class ids into an overlay on the CPU
+        
+        Args:
+            predictions: uint8 class map of shape (H, W)
+            original_array: original image as an RGB uint8 array
+            
+        Returns:
+            numpy array with the blended segmentation overlay
+        """
+        # Get predicted class for each pixel
+        output_predictions = predictions.cpu().numpy()
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Detected classes: %s", np.unique(output_predictions).tolist())
+        
+        # Resize the single-channel class map back to original size, then color it,
+        # so the full-size image is only produced once
+        original_size = (original_array.shape[1], original_array.shape[0])
+        self.logger.debug("Resizing predictions from %s to %s", output_predictions.shape, original_size)
+        output_predictions = cv2.resize(output_predictions, original_size,
+                                        dst=self._get_buf("class_ids", original_array.shape[:2], np.uint8),
+                                        interpolation=cv2.INTER_NEAREST)
+        
+        # Create overlay (blend original image with colored segmentation mask)
+        alpha = self.OVERLAY_ALPHA
+        # The overlay is returned to the caller, so it gets a fresh array rather than a scratch buffer
+        overlay = np.empty_like(original_array)
+        if NUMBA_AVAILABLE:
+            return blend_with_palette(original_array, output_predictions, self._palette,
+                                      overlay, int(alpha * 256))
+        segmentation_mask = self.create_colored_mask(
+            output_predictions, out=self._get_buf("mask", original_array.shape, np.uint8))
+        return cv2.addWeighted(original_array, alpha, segmentation_mask, 1-alpha, 0, dst=overlay)
+    
+    def postprocess_gpu(self, predictions: torch.Tensor, original: torch.Tensor) -> np.ndarray:
+        """
+        Turn predicted class ids into an overlay on the GPU
+        
+        Upsampling, palette lookup and blending all run on the device;
+        only the final uint8 overlay is transferred back to the host.
+        
+        Args:
+            predictions: uint8 class map of shape (H, W) on the device
+            original: original image as an RGB uint8 tensor on the device
+            
+        Returns:
+            numpy array with the blended segmentation overlay
+        """
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Detected classes: %s", torch.unique(predictions).tolist())
+        
+        # Nearest upsample the single-channel class map to the original size,
+        # then color it, so the full-size image is only produced once
+        class_ids = F.interpolate(predictions[None, None],
+                                  size=original.shape[:2], mode='nearest')[0, 0]
+        colored = self._palette_gpu[class_ids.long()]
+        
+        # Blend with the original uploaded during preprocessing, in integer math as in blend_with_palette
+        a256 = int(self.OVERLAY_ALPHA * 256)
+        overlay = ((original.int() * a256 + colored.int() * (256 - a256)) >> 8).byte()
+        return overlay.cpu().numpy()
+    
+    def build_palette(self):
+        """
+        Build the 256-entry class color lookup table
+        
+        Returns:
+            numpy array of shape (256, 3) mapping class index to RGB color
+        """
+        # PASCAL VOC colors, then fixed-seed random colors for any other class id
+        rng = np.random.default_rng(0)
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        palette[:len(VOC_COLORS)] = VOC_COLORS
+        palette[len(VOC_COLORS):] = rng.integers(0, 256, size=(256 - len(VOC_COLORS), 3), dtype=np.uint8)
+        return palette
+    
+    def create_colored_mask(self, predictions, out=None):
         """
         Create a colored segmentation mask from predictions
         
         Args:
             predictions: numpy array of predicted class indices
+            out: optional preallocated (H, W, 3) uint8 destination
             
         Returns:
             numpy array representing colored segmentation mask
         """
-        # Define colors for different classes (PASCAL VOC classes)
-        colors = [
-            [0, 0, 0],       # background
-            [128, 0, 0],     # aeroplane
-            [0, 128, 0],     # bicycle
-            [128, 128, 0],   # bird
-            [0, 0, 128],     # boat
-            [128, 0, 128],   # bottle
-            [0, 128, 128],   # bus
-            [128, 128, 128], # car
-            [64, 0, 0],      # cat
-            [192, 0, 0],     # chair
-            [64, 128, 0],    # cow
-            [192, 128, 0],   # dining table
-            [64, 0, 128],    # dog
-            [192, 0, 128],   # horse
-            [64, 128, 128],  # motorbike
-            [192, 128, 128], # person
-            [0, 64, 0],      # potted plant
-            [128, 64, 0],    # sheep
-            [0, 192, 0],     # sofa
-            [128, 192, 0],   # train
-            [0, 64, 128],    # tv/monitor
-        ]
-        
-        # Extend colors if needed
-        while len(colors) <= predictions.max():
-            colors.append([np.random.randint(0, 255) for _ in range(3)])
-        
-        # Create colored mask
-        h, w = predictions.shape
-        colored_mask = np.zeros((h, w, 3), dtype=np.uint8)
-        
-        for class_id in range(len(colors)):
-            mask = predictions == class_id
-            colored_mask[mask] = colors[class_id]
-            
-        return colored_mask
-
-# Global model instance - with safe initialization
-try:
-    segmentation_model = SemanticSegmentationModel()
-except Exception as e:
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.error(f"Failed to initialize segmentation model: {e}")
-    segmentation_model = None
\ No newline at end of file
+        # Single gather through the color lookup table; mode='clip' lets np.take
+        # write straight into out (mode='raise' buffers through a temporary),
+        # and never clips since uint8 ids always fit the 256-row palette
+        return np.take(self._palette, predictions, axis=0, out=out, mode='clip')
+    
+    def _get_buf(self, name, shape, dtype):
+        """
+        Return this thread's scratch buffer for name, reallocating only when
+        the requested shape or dtype changes
+        
+        The buffer is overwritten by the next call on the same thread, so it
+        must not be handed back to callers.
+        """
+        buf = getattr(self._buf, name, None)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            setattr(self._buf, name, buf)
+        return buf
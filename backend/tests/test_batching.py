@@ -0,0 +1,186 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from models.batching import BatchedSegmenter
+
+
+class StubModel:
+    """Stands in for SemanticSegmentationModel with cheap, traceable steps"""
+
+    def __init__(self, device="cpu", error=None):
+        self.device = torch.device(device)
+        self.model = object()
+        self.error = error
+        self.batch_sizes = []
+        self.threads = {}
+        self._infer_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    def to_rgb_array(self, image):
+        return np.asarray(image)
+
+    def preprocess_image(self, image):
+        self.threads["preprocess"] = threading.current_thread().name
+        value = float(image.getpixel((0, 0))[0])
+        return torch.full((3, 4, 4), value), torch.from_numpy(np.array(image))
+
+    def infer(self, batch):
+        self.threads["infer"] = threading.current_thread().name
+        self.batch_sizes.append(batch.shape[0])
+        if self.error is not None:
+            raise self.error
+        return batch[:, 0].to(torch.uint8)
+
+    def render_overlay(self, original, predictions):
+        self.threads["render"] = threading.current_thread().name
+        return np.full(original.shape, int(predictions[0, 0]), dtype=np.uint8)
+
+    async def run_in_infer_pool(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._infer_pool, func, *args)
+
+
+def make_image(value):
+    return Image.new("RGB", (8, 6), (value, value, value))
+
+
+def run_with(segmenter, coro_fn):
+    """Run coro_fn() on a fresh event loop with the segmenter's batching task started"""
+    async def main():
+        segmenter.start()
+        try:
+            return await coro_fn()
+        finally:
+            await segmenter.stop()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_forward_pass():
+    model = StubModel()
+    segmenter = BatchedSegmenter(model, max_batch_size=4, max_wait=0.2)
+
+    results = run_with(segmenter, lambda: asyncio.gather(*(segmenter.submit(make_image(v)) for v in (10, 20, 30))))
+
+    assert model.batch_sizes == [3]
+    # Each waiter gets the predictions for its own image back
+    assert [int(r[0, 0, 0]) for r in results] == [10, 20, 30]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = StubModel()
+    segmenter = BatchedSegmenter(model, max_batch_size=2, max_wait=0.2)
+
+    run_with(segmenter, lambda: asyncio.gather(*(segmenter.submit(make_image(v)) for v in range(5))))
+
+    assert sum(model.batch_sizes) == 5
+    assert max(model.batch_sizes) <= 2
+
+
+def test_collect_closes_the_window_after_max_wait():
+    segmenter = BatchedSegmenter(StubModel(), max_batch_size=4, max_wait=0.05)
+
+    async def collect():
+        segmenter._queue = asyncio.Queue()
+        await segmenter._queue.put("first")
+        start = time.monotonic()
+        items = await segmenter._collect()
+        return items, time.monotonic() - start
+
+    items, elapsed = asyncio.run(collect())
+
+    assert items == ["first"]
+    assert 0.04 <= elapsed < 1
+
+
+def test_collect_returns_as_soon_as_the_batch_is_full():
+    segmenter = BatchedSegmenter(StubModel(), max_batch_size=2, max_wait=10)
+
+    async def collect():
+        segmenter._queue = asyncio.Queue()
+        for item in ("first", "second", "third"):
+            await segmenter._queue.put(item)
+        return await asyncio.wait_for(segmenter._collect(), timeout=1)
+
+    assert asyncio.run(collect()) == ["first", "second"]
+
+
+def test_cancelled_requests_are_dropped_from_the_batch():
+    model = StubModel()
+    segmenter = BatchedSegmenter(model, max_batch_size=4, max_wait=0.05)
+
+    async def submit_one_cancelled():
+        loop = asyncio.get_running_loop()
+        cancelled, waiting = loop.create_future(), loop.create_future()
+        cancelled.cancel()
+        await segmenter._queue.put((torch.zeros(3, 4, 4), cancelled))
+        await segmenter._queue.put((torch.ones(3, 4, 4), waiting))
+        return await waiting
+
+    predictions = run_with(segmenter, submit_one_cancelled)
+
+    assert model.batch_sizes == [1]
+    assert int(predictions[0, 0]) == 1
+
+
+def test_inference_errors_reach_every_waiter():
+    model = StubModel(error=RuntimeError("out of memory"))
+    segmenter = BatchedSegmenter(model, max_batch_size=4, max_wait=0.2)
+
+    results = run_with(segmenter, lambda: asyncio.gather(
+        *(segmenter.submit(make_image(v)) for v in range(3)), return_exceptions=True))
+
+    assert model.batch_sizes == [3]
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_batching_keeps_running_after_an_error():
+    model = StubModel(error=RuntimeError("out of memory"))
+    segmenter = BatchedSegmenter(model, max_batch_size=4, max_wait=0.01)
+
+    async def fail_then_succeed():
+        with pytest.raises(RuntimeError):
+            await segmenter.submit(make_image(1))
+        model.error = None
+        return await segmenter.submit(make_image(2))
+
+    assert int(run_with(segmenter, fail_then_succeed)[0, 0, 0]) == 2
+
+
+def test_only_inference_runs_on_the_inference_thread():
+    model = StubModel()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+    segmenter = BatchedSegmenter(model, max_batch_size=1, executor=executor)
+
+    run_with(segmenter, lambda: segmenter.submit(make_image(5)))
+
+    assert model.batch_sizes == [1]
+    assert model.threads["infer"].startswith("inference")
+    assert model.threads["preprocess"].startswith("encode")
+    assert model.threads["render"].startswith("encode")
+
+
+def test_unloaded_model_returns_the_original():
+    model = StubModel()
+    model.model = None
+    segmenter = BatchedSegmenter(model, max_batch_size=4)
+
+    result = run_with(segmenter, lambda: segmenter.submit(make_image(7)))
+
+    assert model.batch_sizes == []
+    assert int(result[0, 0, 0]) == 7
+
+
+@pytest.mark.parametrize("device, expected", [("cpu", 1), ("cuda", 8)])
+def test_default_max_batch_size_depends_on_device(monkeypatch, device, expected):
+    monkeypatch.delenv("BATCH_MAX_SIZE", raising=False)
+    assert BatchedSegmenter(StubModel(device)).max_batch_size == expected
+
+
+def test_max_batch_size_from_environment(monkeypatch):
+    monkeypatch.setenv("BATCH_MAX_SIZE", "3")
+    assert BatchedSegmenter(StubModel()).max_batch_size == 3
@@ -0,0 +1,96 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+
+# Not entered as a context manager, so startup (model loading) is skipped
+client = TestClient(main.app)
+
+ORIGINAL = (b"original-bytes", "image/png")
+SEGMENTED = (b"segmented-bytes", "image/jpeg")
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    main.result_cache.clear()
+    yield
+    main.result_cache.clear()
+
+
+def parse_multipart(response):
+    """Split a multipart/mixed response into {name: (headers, body)}"""
+    boundary = response.headers["content-type"].split("boundary=")[1].encode()
+    parts = {}
+    for part in response.content.split(b"--" + boundary)[1:-1]:
+        head, body = part.strip(b"\r\n").split(b"\r\n\r\n", 1)
+        headers = dict(line.split(": ", 1) for line in head.decode().split("\r\n"))
+        name = headers["Content-Disposition"].split('name="')[1].rstrip('"')
+        parts[name] = (headers, body)
+    return parts
+
+
+def test_result_images_are_served_as_raw_bytes():
+    result_id = main._store_result(ORIGINAL, SEGMENTED)
+
+    for name, (content, media_type) in (("original", ORIGINAL), ("segmented", SEGMENTED)):
+        response = client.get(f"/result/{result_id}/{name}")
+        assert response.status_code == 200
+        assert response.content == content
+        assert response.headers["content-type"] == media_type
+        assert response.headers["cache-control"] == main.RESULT_CACHE_HEADERS["Cache-Control"]
+
+
+def test_result_returns_both_images_as_multipart():
+    result_id = main._store_result(ORIGINAL, SEGMENTED)
+
+    response = client.get(f"/result/{result_id}")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("multipart/mixed; boundary=")
+    parts = parse_multipart(response)
+    assert list(parts) == ["original", "segmented"]
+    assert parts["original"] == ({"Content-Type": "image/png", "Content-Disposition": 'inline; name="original"'},
+                                 b"original-bytes")
+    assert parts["segmented"][0]["Content-Type"] == "image/jpeg"
+    assert parts["segmented"][1] == b"segmented-bytes"
+
+
+@pytest.mark.parametrize("path", ["/result/missing", "/result/missing/original", "/result/missing/segmented"])
+def test_unknown_result_is_not_found(path):
+    assert client.get(path).status_code == 404
+
+
+def test_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(main, "RESULT_CACHE_SIZE", 2)
+    first = main._store_result(ORIGINAL, SEGMENTED)
+    second = main._store_result(ORIGINAL, SEGMENTED)
+
+    # Reading the first result makes the second the least recently used
+    assert client.get(f"/result/{first}/original").status_code == 200
+    third = main._store_result(ORIGINAL, SEGMENTED)
+
+    assert list(main.result_cache) == [first, third]
+    assert client.get(f"/result/{second}").status_code == 404
+    assert client.get(f"/result/{first}").status_code == 200
+
+
+def test_upload_result_is_served_from_the_returned_urls(monkeypatch):
+    # Without a loaded model the upload is returned unsegmented
+    monkeypatch.setattr(main.app.state, "segmenter", None)
+    buffered = io.BytesIO()
+    Image.new("RGB", (32, 24), (200, 100, 50)).save(buffered, format="PNG")
+
+    response = client.post("/upload", files={"file": ("test.png", buffered.getvalue(), "image/png")})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["processing_info"]["image_size"] == [32, 24]
+    original = client.get(data["original_image_url"])
+    assert original.content == buffered.getvalue()
+    assert original.headers["content-type"] == "image/png"
+    segmented = client.get(data["segmented_image_url"])
+    assert segmented.status_code == 200
+    assert Image.open(io.BytesIO(segmented.content)).size == (32, 24)
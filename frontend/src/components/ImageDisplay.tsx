@@ -1,5 +1,6 @@
 import React from 'react';
 import type { SegmentationResult } from '../types';
+import { resultImageUrl } from '../services/api';
 
 interface ImageDisplayProps {
   result: SegmentationResult | null;
@@ -32,7 +33,7 @@ const ImageDisplay: React.FC<ImageDisplayProps> = ({ result, isLoading }) => {
         <div className="image-container">
           <h3>Original Image</h3>
           <img
-            src={`data:image/png;base64,${result.original_image}`}
+            src={resultImageUrl(result.original_image_url)}
             alt="Original"
             className="result-image"
           />
@@ -41,7 +42,7 @@ const ImageDisplay: React.FC<ImageDisplayProps> = ({ result, isLoading }) => {
         <div className="image-container">
           <h3>Segmentation Result</h3>
           <img
-            src={`data:image/png;base64,${result.segmented_image}`}
+            src={resultImageUrl(result.segmented_image_url)}
             alt="Segmentation Result"
             className="result-image"
           />
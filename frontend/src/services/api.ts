@@ -24,4 +24,6 @@ export const segmentFromUrl = async (imageUrl: string): Promise<SegmentationResu
   const response = await api.post(`/segment-url?image_url=${encodeURIComponent(imageUrl)}`);
   
   return response.data;
-};
\ No newline at end of file
+};
+
+export const resultImageUrl = (path: string): string => `${API_BASE_URL}${path}`;
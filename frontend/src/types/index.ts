@@ -1,6 +1,7 @@
 export interface SegmentationResult {
-  original_image: string;
-  segmented_image: string;
+  result_id: string;
+  original_image_url: string;
+  segmented_image_url: string;
   filename?: string;
   source_url?: string;
 }
@@ -16,4 +16,5 @@ if __name__ == "__main__":
     print("API will be available at: http://localhost:8000")
     print("API documentation at: http://localhost:8000/docs")
     
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True,
+                access_log=False)
\ No newline at end of file